@@ -4,25 +4,100 @@ CANopen BMS Client for SuperB Epsilon V2 Battery
 Reads SDO values from BMS nodes via CAN bus
 """
 
+import asyncio
 import can
+import queue
+import select
+import socket
 import struct
+import threading
 import time
 import logging
-from typing import Optional, Tuple, Dict, Any
+import weakref
+from contextlib import contextmanager
+from typing import Optional, Tuple, Dict, Any, Set
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
+# struct can_frame from <linux/can.h>: can_id, len, 3 pad bytes, data[8]
+_CAN_FRAME = struct.Struct('=IB3x8s')
 
-@dataclass
-class SDODefinition:
+# SDO frame: command specifier, index, subindex, 4 data bytes
+_SDO_STRUCT = struct.Struct('<BHB4s')
+
+# Expedited download command specifier indexed by data length (1-4 bytes)
+_DL_CMDS = (None, 0x2F, 0x2B, 0x27, 0x23)
+
+# SDO abort codes meaning the object or subindex does not exist on the node
+_ABORT_NOT_PRESENT = frozenset((0x06020000, 0x06090011))
+
+# can_id flag set by SocketCAN for 29-bit identifiers
+_CAN_EFF_FLAG = 0x80000000
+
+# Kernel filter kept on the socket for the client's lifetime: every SDO TX
+# COB-ID (0x580-0x5FF), so other VE.Can traffic never queues up between polls
+_SDO_TX_FILTER = [{'can_id': 0x580, 'can_mask': 0x780, 'extended': False}]
+
+# Socket receive buffer requested in connect(), so a burst of SDO responses
+# from several nodes is not dropped by the kernel. SO_RCVBUFFORCE (root only,
+# ignores net.core.rmem_max) is not exported by the socket module.
+_RCVBUF_SIZE = 1 << 20
+_SO_RCVBUFFORCE = getattr(socket, 'SO_RCVBUFFORCE', 33)
+
+# Little-endian struct format per SDO data type
+_DATA_TYPES = {
+    'UINT8': '<B',
+    'INT8': '<b',
+    'UINT16': '<H',
+    'INT16': '<h',
+    'UINT32': '<I',
+    'INT32': '<i',
+}
+
+# Every data type must fit the 4 data bytes of an expedited SDO
+assert all(struct.calcsize(fmt) <= 4 for fmt in _DATA_TYPES.values())
+
+# Decoders per SDO data type; each returns a 1-tuple
+_DECODERS = {data_type: struct.Struct(fmt).unpack_from for data_type, fmt in _DATA_TYPES.items()}
+
+
+class FrozenSlotted:
+    """
+    Base for frozen dataclasses that declare __slots__ by hand
+    
+    dataclass(slots=True) needs Python 3.10. This adds the copy/pickle
+    support it would: the default restore assigns attributes, which the
+    frozen __setattr__ refuses.
+    """
+    __slots__ = ()
+    
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+
+@dataclass(frozen=True)
+class SDODefinition(FrozenSlotted):
     """SDO object definition"""
+    # Explicit slots (see FrozenSlotted); inv_divisor is derived from
+    # divisor in __post_init__ and is not a dataclass field
+    __slots__ = ('index', 'subindex', 'data_type', 'divisor', 'name', 'unit', 'inv_divisor')
+    
     index: int
     subindex: int
     data_type: str
     divisor: float
     name: str
     unit: str
+    
+    def __post_init__(self):
+        if self.data_type not in _DECODERS:
+            raise ValueError(f"Unknown data type: {self.data_type}")
+        object.__setattr__(self, 'inv_divisor', 1.0 / self.divisor)
 
 
 class CANopenSDOClient:
@@ -37,6 +112,7 @@ class CANopenSDOClient:
         'cycles': SDODefinition(0x6050, 0x00, 'UINT16', 1.0, 'Charge Cycles', ''),
         'ah_since_eq': SDODefinition(0x6053, 0x00, 'INT32', 8.0, 'Ah Since Equalization', 'Ah'),
         'highest_temp': SDODefinition(0x6020, 0x00, 'INT16', 8.0, 'Highest Temperature', '°C'),
+        'error_status': SDODefinition(0x2004, 0x00, 'UINT16', 1.0, 'Error Status', ''),  # alarm bitfield
         
         # Device identity
         'vendor_id': SDODefinition(0x1018, 0x01, 'UINT32', 1.0, 'Vendor ID', ''),
@@ -49,6 +125,22 @@ class CANopenSDOClient:
         'ah_returned': SDODefinition(0x6052, 0x00, 'INT16', 8.0, 'Ah Returned', 'Ah'),  # v1.2+
     }
     
+    # SDO_MAP flattened to (name, index, subindex, unpack, inv_divisor) rows
+    # for the read_all_parameters() hot loop; unpack is the data type's
+    # Struct.unpack_from, so a response is decoded and scaled without lookups
+    _ALL_PARAMS = tuple(
+        (name, sdo.index, sdo.subindex, _DECODERS[sdo.data_type], sdo.inv_divisor)
+        for name, sdo in SDO_MAP.items()
+    )
+    
+    # Device identity (0x1018) never changes while a node is up, so it is
+    # read once per node and cached; the remaining rows are read every time
+    _IDENTITY_PARAMS = tuple(row for row in _ALL_PARAMS if row[1] == 0x1018)
+    _LIVE_PARAMS = tuple(row for row in _ALL_PARAMS if row[1] != 0x1018)
+    
+    # Maximum number of outstanding SDO uploads in read_many()
+    SDO_MAX_IN_FLIGHT = 4
+    
     def __init__(self, can_interface: str = 'can0', bitrate: int = 250000):
         """
         Initialize CANopen client
@@ -60,6 +152,50 @@ class CANopenSDOClient:
         self.can_interface = can_interface
         self.bitrate = bitrate
         self.bus: Optional[can.Bus] = None
+        # Underlying SocketCAN socket of self.bus, read directly for SDO responses
+        self._raw_sock: Optional[socket.socket] = None
+        # poll() object registered once on _raw_sock, and the frame buffer it
+        # is read into, so receiving a frame allocates no fd sets or buffers
+        self._poller: Optional[select.poll] = None
+        self._rx_buf = bytearray(_CAN_FRAME.size)
+        self._filter_active = False
+        
+        # Upload request payloads by (index, subindex), built on first use
+        self._req_cache: Dict[Tuple[int, int], bytes] = {}
+        # Reused for every upload request instead of allocating a Message per SDO
+        self._tx_msg = can.Message(arbitration_id=0, data=bytes(8), is_extended_id=False)
+        self._tx_lock = threading.Lock()
+        # Serialise SDO transactions: per node while the reader thread routes
+        # responses, otherwise on the whole bus (see _transaction). _mode_lock
+        # guards choosing between the two against start/stop_reader().
+        self._node_locks: Dict[int, threading.Lock] = {}
+        self._bus_lock = threading.Lock()
+        self._mode_lock = threading.Lock()
+        # Per-thread flag: inside _transaction(), nested calls take no locks
+        self._tx_local = threading.local()
+        # node_id -> identity parameter values, see _IDENTITY_PARAMS
+        self._identity_cache: Dict[int, Dict[str, float]] = {}
+        # (node_id, index, subindex) the node answered "does not exist" for;
+        # not probed again until invalidate_capability_cache()
+        self._unsupported: Set[Tuple[int, int, int]] = set()
+        
+        # asyncio API: (node_id, index, subindex) -> Future of (data, abort code)
+        self._async_pending: Dict[Tuple[int, int, int], asyncio.Future] = {}
+        # Future -> number of read_sdo_async() calls awaiting it
+        self._async_waiters: Dict[asyncio.Future, int] = {}
+        self._notifier: Optional[can.Notifier] = None
+        self._async_reader: Optional[can.AsyncBufferedReader] = None
+        self._dispatch_task: Optional[asyncio.Task] = None
+        # Loop the dispatcher is bound to, and number of async calls using it;
+        # it runs only while that number is non-zero (see _async_enter)
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_users = 0
+        
+        # Background reader (start_reader): (node_id, index, subindex) -> queue
+        # of (can_id, data) frames. Entries vanish with the waiting caller.
+        self._pending: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        self._reader_thread: Optional[threading.Thread] = None
+        self._reader_stop = threading.Event()
         
     def connect(self) -> bool:
         """Connect to CAN bus"""
@@ -72,7 +208,7 @@ class CANopenSDOClient:
                     channel=self.can_interface,
                     interface='socketcan'
                 )
-                logger.info(f"Connected to pre-configured {self.can_interface}")
+                logger.info("Connected to pre-configured %s", self.can_interface)
             else:
                 # Regular Linux CAN interface, set bitrate
                 self.bus = can.Bus(
@@ -80,19 +216,334 @@ class CANopenSDOClient:
                     interface='socketcan',
                     bitrate=self.bitrate
                 )
-                logger.info(f"Connected to {self.can_interface} at {self.bitrate} bps")
+                logger.info("Connected to %s at %d bps", self.can_interface, self.bitrate)
+            self.bus.set_filters(_SDO_TX_FILTER)
+            self._raw_sock = getattr(self.bus, 'socket', None)
+            if self._raw_sock is not None:
+                self._enlarge_rcvbuf(self._raw_sock)
+                self._poller = select.poll()
+                self._poller.register(self._raw_sock, select.POLLIN)
+                self._flush_rx()
             return True
         except Exception as e:
-            logger.error(f"Failed to connect to CAN bus: {e}")
+            logger.error("Failed to connect to CAN bus: %s", e)
             return False
     
+    def _enlarge_rcvbuf(self, sock: socket.socket):
+        """Raise the socket receive buffer to _RCVBUF_SIZE (best effort)"""
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, _SO_RCVBUFFORCE, _RCVBUF_SIZE)
+        except OSError:
+            # Not privileged: the kernel caps the request at net.core.rmem_max
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _RCVBUF_SIZE)
+            except OSError as e:
+                logger.debug("Could not enlarge CAN receive buffer: %s", e)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("CAN receive buffer: %d bytes", sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF))
+    
+    def _flush_rx(self):
+        """Discard frames queued on the raw socket before the filter was installed"""
+        sock = self._raw_sock
+        try:
+            while True:
+                sock.recv_into(self._rx_buf, _CAN_FRAME.size, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            pass
+    
     def disconnect(self):
         """Disconnect from CAN bus"""
+        self.stop_reader()
+        self._stop_async_dispatch()
         if self.bus:
+            self._raw_sock = None
+            self._poller = None
             self.bus.shutdown()
             self.bus = None
             logger.info("Disconnected from CAN bus")
     
+    @contextmanager
+    def _with_filter(self, node_id: Optional[int] = None):
+        """
+        Narrow the SDO response filter to one node for the duration of the block
+        
+        connect() keeps the kernel (SocketCAN) filter on every SDO TX COB-ID,
+        so unrelated frames never reach Python; a single-node block narrows
+        it further and restores it afterwards. A broad block only pins the
+        installed filter. Nested use keeps the outermost filter.
+        
+        Args:
+            node_id: Accept SDO TX of this node only (0x580 + node_id),
+                     or None to keep accepting every SDO TX COB-ID (0x580-0x5FF)
+        """
+        if self._filter_active:
+            yield
+            return
+        
+        if node_id is None:
+            # Already installed: pin it, so nested single-node use keeps it
+            self._filter_active = True
+            try:
+                yield
+            finally:
+                self._filter_active = False
+            return
+        
+        self.bus.set_filters([{'can_id': 0x580 + node_id, 'can_mask': 0x7FF, 'extended': False}])
+        self._filter_active = True
+        try:
+            yield
+        finally:
+            self._filter_active = False
+            self.bus.set_filters(_SDO_TX_FILTER)
+    
+    @contextmanager
+    def _transaction(self, node_ids):
+        """
+        Hold the locks for SDO exchanges with the given nodes
+        
+        The SDO server of a node handles one exchange per object at a time,
+        so callers in different threads must not interleave on the same
+        node. Without the reader thread every caller reads the socket
+        itself, so the whole bus is locked instead.
+        
+        Args:
+            node_ids: CANopen node IDs the block talks to
+        """
+        local = self._tx_local
+        if getattr(local, 'active', False):
+            # Nested (e.g. read_sdo() inside scan_network()): the outer
+            # transaction already holds the locks for these nodes
+            yield
+            return
+        
+        node_ids = sorted(set(node_ids))
+        while True:
+            with self._mode_lock:
+                reader = self._reader_thread
+                if reader is None:
+                    locks = [self._bus_lock]
+                else:
+                    # Fixed order, so concurrent multi-node callers cannot deadlock
+                    node_locks = self._node_locks
+                    locks = [node_locks.setdefault(node_id, threading.Lock()) for node_id in node_ids]
+            
+            for lock in locks:
+                lock.acquire()
+            if self._reader_thread is reader:
+                break
+            # The reader was started or stopped while waiting: pick again
+            for lock in reversed(locks):
+                lock.release()
+        
+        local.active = True
+        try:
+            yield
+        finally:
+            local.active = False
+            for lock in reversed(locks):
+                lock.release()
+    
+    @contextmanager
+    def exclusive_bus(self):
+        """
+        Hand the bus to another CAN user (e.g. the firmware updater) for the block
+        
+        Stops the reader thread and waits out running SDO transactions; new
+        ones block until the block ends. The kernel filter accepts every
+        frame meanwhile; afterwards the SDO TX filter is restored and frames
+        left on the socket are discarded. Not to be combined with the
+        asyncio API, which reads the bus on its own.
+        
+        Yields:
+            The python-can bus
+        """
+        restart = self._reader_thread is not None
+        self.stop_reader()
+        try:
+            # The reader is stopped, so this holds the whole bus
+            with self._transaction(()), self._with_filter():
+                self.bus.set_filters(None)
+                try:
+                    yield self.bus
+                finally:
+                    self.bus.set_filters(_SDO_TX_FILTER)
+                    if self._raw_sock is not None:
+                        self._flush_rx()
+        finally:
+            if restart:
+                self.start_reader()
+    
+    def _send_upload_request(self, node_id: int, index: int, subindex: int):
+        """Send an SDO initiate upload request (0x40) to SDO RX (0x600 + node_id)"""
+        key = (index, subindex)
+        data = self._req_cache.get(key)
+        if data is None:
+            data = self._req_cache[key] = struct.pack('<BHB4x', 0x40, index, subindex)
+        
+        with self._tx_lock:
+            msg = self._tx_msg
+            msg.arbitration_id = 0x600 + node_id
+            msg.data = data
+            self.bus.send(msg)
+    
+    def _note_abort(self, node_id: int, index: int, subindex: int, abort_code: int):
+        """Remember objects the node reported as not present"""
+        if abort_code in _ABORT_NOT_PRESENT:
+            self._unsupported.add((node_id, index, subindex))
+    
+    def invalidate_capability_cache(self, node_id: int):
+        """
+        Forget what is known about a node's objects and identity
+        
+        Call after a firmware update, so parameters that were reported as
+        not present are probed again and the identity is re-read.
+        
+        Args:
+            node_id: CANopen node ID
+        """
+        self._unsupported = {key for key in self._unsupported if key[0] != node_id}
+        self._identity_cache.pop(node_id, None)
+    
+    def start_reader(self):
+        """
+        Start the background receive thread
+        
+        From then on one thread reads the bus and hands every SDO response
+        to the transaction waiting for it, so SDO exchanges may be issued
+        from several threads at once (e.g. one per node) without stealing
+        each other's frames. Not to be combined with the asyncio API.
+        """
+        with self._mode_lock, self._bus_lock:
+            # Holding the bus lock waits out direct-socket transactions, and
+            # the mode lock keeps new ones from starting until the switch
+            if self._reader_thread is not None or not self.bus:
+                return
+            
+            # Keep the broad SDO TX filter for the reader's lifetime
+            self._filter_active = True
+            
+            self._reader_stop.clear()
+            self._reader_thread = threading.Thread(target=self._reader_loop, name='canopen-sdo-reader', daemon=True)
+            self._reader_thread.start()
+        logger.info("SDO reader thread started")
+    
+    def stop_reader(self):
+        """Stop the background receive thread, if running"""
+        with self._mode_lock:
+            thread = self._reader_thread
+            if thread is None:
+                return
+            
+            # Wait out transactions waiting on reader slots; no node lock
+            # can be added meanwhile, since that needs the mode lock
+            locks = [self._node_locks[node_id] for node_id in sorted(self._node_locks)]
+            locks.append(self._bus_lock)
+            for lock in locks:
+                lock.acquire()
+            try:
+                self._reader_stop.set()
+                thread.join()
+                self._reader_thread = None
+                self._filter_active = False
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+    
+    def _reader_loop(self):
+        """Route received SDO responses to the pending slot for their object"""
+        recv = self._recv_frame
+        pending = self._pending
+        while not self._reader_stop.is_set():
+            try:
+                frame = recv(1.0)
+            except Exception as e:
+                logger.error("SDO reader stopped: %s", e)
+                self._reader_died()
+                break
+            
+            if frame is None or len(frame[1]) < _SDO_STRUCT.size:
+                continue
+            
+            _, index, subindex, _ = _SDO_STRUCT.unpack_from(frame[1])
+            slot = pending.get((frame[0] - 0x580, index, subindex))
+            if slot is not None:
+                slot.put_nowait(frame)
+    
+    def _reader_died(self):
+        """Fall back to direct socket reads after the reader thread failed"""
+        # No locks here: stop_reader() may hold them while joining this thread.
+        # The broad SDO TX filter stays installed; unpin it first, then switch
+        # new transactions over.
+        self._filter_active = False
+        if self._reader_thread is threading.current_thread():
+            self._reader_thread = None
+    
+    def _frame_source(self, keys):
+        """
+        Get a recv(timeout) callable for the responses to an SDO transaction
+        
+        Without the reader thread this is _recv_frame() itself. With it, a
+        slot is registered for the given (node_id, index, subindex) keys and
+        recv() takes frames from the slot; the slot lives as long as the
+        returned callable. Call before sending, so no response is missed.
+        
+        Args:
+            keys: (node_id, index, subindex) of every expected response
+            
+        Returns:
+            Callable taking a timeout and returning (can_id, data) or None
+        """
+        if self._reader_thread is None:
+            return self._recv_frame
+        
+        slot = queue.Queue()
+        for key in keys:
+            self._pending[key] = slot
+        
+        def recv(timeout: float) -> Optional[Tuple[int, bytes]]:
+            try:
+                return slot.get(timeout=timeout)
+            except queue.Empty:
+                return None
+        
+        return recv
+    
+    def _recv_frame(self, timeout: float) -> Optional[Tuple[int, bytes]]:
+        """
+        Receive one CAN frame as (can_id, data)
+        
+        Reads struct can_frame straight off the SocketCAN socket, bypassing
+        python-can's Message construction. can_id keeps the kernel flag bits,
+        so extended, RTR and error frames never equal an 11-bit COB-ID.
+        Falls back to bus.recv() for interfaces without a raw socket.
+        
+        Args:
+            timeout: Maximum time to wait in seconds
+            
+        Returns:
+            Tuple of (can_id, data), or None on timeout
+        """
+        sock = self._raw_sock
+        if sock is None:
+            msg = self.bus.recv(timeout=timeout)
+            if msg is None:
+                return None
+            can_id = msg.arbitration_id
+            if msg.is_extended_id or msg.is_remote_frame or msg.is_error_frame:
+                can_id |= _CAN_EFF_FLAG
+            return can_id, bytes(msg.data)
+        
+        if not self._poller.poll(max(timeout, 0.0) * 1000.0):
+            return None
+        try:
+            sock.recv_into(self._rx_buf, _CAN_FRAME.size, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return None
+        can_id, dlc, data = _CAN_FRAME.unpack_from(self._rx_buf)
+        return can_id, data[:dlc]
+    
     def read_sdo(self, node_id: int, index: int, subindex: int, timeout: float = 0.5) -> Tuple[Optional[bytes], Optional[int]]:
         """
         Read SDO value from CANopen node
@@ -110,51 +561,42 @@ class CANopenSDOClient:
             logger.error("CAN bus not connected")
             return None, None
         
-        # SDO upload request (0x40 = initiate upload)
-        cmd = 0x40
-        data = bytes([
-            cmd,
-            index & 0xFF,
-            (index >> 8) & 0xFF,
-            subindex,
-            0, 0, 0, 0
-        ])
-        
-        # Send to SDO RX (0x600 + node_id)
-        msg = can.Message(
-            arbitration_id=0x600 + node_id,
-            data=data,
-            is_extended_id=False
-        )
-        
-        try:
-            self.bus.send(msg)
-        except Exception as e:
-            logger.error(f"Failed to send SDO request: {e}")
-            return None, None
-        
-        # Wait for response from SDO TX (0x580 + node_id)
-        start = time.time()
-        while time.time() - start < timeout:
+        with self._transaction([node_id]), self._with_filter(node_id):
+            recv = self._frame_source([(node_id, index, subindex)])
             try:
-                recv_msg = self.bus.recv(timeout=timeout - (time.time() - start))
-                
-                if recv_msg and recv_msg.arbitration_id == 0x580 + node_id:
-                    # Check response type
-                    if recv_msg.data[0] == 0x80:  # Abort
-                        abort_code = struct.unpack('<I', recv_msg.data[4:8])[0]
-                        logger.debug(f"SDO abort 0x{index:04X}:{subindex:02X} = 0x{abort_code:08X}")
-                        return None, abort_code
-                    elif recv_msg.data[0] in [0x43, 0x47, 0x4B, 0x4F]:  # Upload response
-                        return recv_msg.data[4:8], None
-                        
+                self._send_upload_request(node_id, index, subindex)
             except Exception as e:
-                logger.debug(f"SDO recv error: {e}")
+                logger.error("Failed to send SDO request: %s", e)
+                return None, None
+            
+            # Wait for response from SDO TX (0x580 + node_id)
+            monotonic = time.monotonic
+            deadline = monotonic() + timeout
+            while (remaining := deadline - monotonic()) > 0:
+                try:
+                    frame = recv(remaining)
+                    
+                    if frame and frame[0] == 0x580 + node_id:
+                        cmd, resp_index, resp_subindex, payload = _SDO_STRUCT.unpack_from(frame[1])
+                        if resp_index != index or resp_subindex != subindex:
+                            continue
+                        
+                        # Check response type
+                        if cmd == 0x80:  # Abort
+                            abort_code = int.from_bytes(payload, 'little')
+                            logger.debug("SDO abort 0x%04X:%02X = 0x%08X", index, subindex, abort_code)
+                            self._note_abort(node_id, index, subindex, abort_code)
+                            return None, abort_code
+                        elif cmd in [0x43, 0x47, 0x4B, 0x4F]:  # Upload response
+                            return payload, None
+                            
+                except Exception as e:
+                    logger.debug("SDO recv error: %s", e)
                 
-        logger.debug(f"SDO timeout 0x{index:04X}:{subindex:02X}")
+        logger.debug("SDO timeout 0x%04X:%02X", index, subindex)
         return None, None
     
-    def decode_value(self, raw_data: bytes, data_type: str) -> Optional[int]:
+    def decode_value(self, raw_data: bytes, data_type: str) -> int:
         """
         Decode raw SDO data based on type
         
@@ -163,27 +605,13 @@ class CANopenSDOClient:
             data_type: Data type string ('INT16', 'UINT32', etc.)
             
         Returns:
-            Decoded integer value or None
+            Decoded integer value
+            
+        Raises:
+            KeyError: Unknown data type
+            struct.error: raw_data too short for data_type (malformed frame)
         """
-        try:
-            if data_type == 'UINT8':
-                return raw_data[0]
-            elif data_type == 'INT8':
-                return struct.unpack('<b', raw_data[:1])[0]
-            elif data_type == 'UINT16':
-                return struct.unpack('<H', raw_data[:2])[0]
-            elif data_type == 'INT16':
-                return struct.unpack('<h', raw_data[:2])[0]
-            elif data_type == 'UINT32':
-                return struct.unpack('<I', raw_data[:4])[0]
-            elif data_type == 'INT32':
-                return struct.unpack('<i', raw_data[:4])[0]
-            else:
-                logger.error(f"Unknown data type: {data_type}")
-                return None
-        except Exception as e:
-            logger.error(f"Failed to decode {data_type}: {e}")
-            return None
+        return _DECODERS[data_type](raw_data)[0]
     
     def read_parameter(self, node_id: int, param_name: str) -> Optional[float]:
         """
@@ -197,27 +625,29 @@ class CANopenSDOClient:
             Converted value or None
         """
         if param_name not in self.SDO_MAP:
-            logger.error(f"Unknown parameter: {param_name}")
+            logger.error("Unknown parameter: %s", param_name)
             return None
         
         sdo = self.SDO_MAP[param_name]
+        if (node_id, sdo.index, sdo.subindex) in self._unsupported:
+            return None
+        
         raw_data, abort = self.read_sdo(node_id, sdo.index, sdo.subindex)
         
         if abort is not None:
-            logger.debug(f"{param_name} not available (abort 0x{abort:08X})")
+            logger.debug("%s not available (abort 0x%08X)", param_name, abort)
             return None
         
         if raw_data is None:
-            logger.debug(f"{param_name} timeout")
+            logger.debug("%s timeout", param_name)
             return None
         
         raw_value = self.decode_value(raw_data, sdo.data_type)
-        if raw_value is None:
-            return None
         
         # Apply conversion
-        converted = raw_value / sdo.divisor
-        logger.info(f"Node {node_id} {param_name}: raw={raw_value}, converted={converted}")
+        converted = raw_value * sdo.inv_divisor
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Node %d %s: raw=%d, converted=%s", node_id, param_name, raw_value, converted)
         return converted
     
     def write_sdo(self, node_id: int, index: int, subindex: int, data: bytes, timeout: float = 2.0) -> bool:
@@ -238,32 +668,15 @@ class CANopenSDOClient:
             logger.error("CAN bus not connected")
             return False
         
-        if len(data) > 4:
+        if not 1 <= len(data) <= 4:
             logger.error("Only expedited SDO download (1-4 bytes) supported")
             return False
         
-        # Build SDO download request
-        # Command byte: 0x2F (1 byte), 0x2B (2 bytes), 0x27 (3 bytes), 0x23 (4 bytes)
-        cmd_map = {1: 0x2F, 2: 0x2B, 3: 0x27, 4: 0x23}
-        cmd = cmd_map.get(len(data), 0x23)
-        
-        # Pad data to 4 bytes
-        padded_data = data + bytes(4 - len(data))
-        
         sdo_tx = 0x600 + node_id
         sdo_rx = 0x580 + node_id
         
-        # Create download request message
-        msg_data = bytes([
-            cmd,
-            index & 0xFF,
-            (index >> 8) & 0xFF,
-            subindex,
-            padded_data[0],
-            padded_data[1],
-            padded_data[2],
-            padded_data[3]
-        ])
+        # Create download request message (Struct pads data to 4 bytes)
+        msg_data = _SDO_STRUCT.pack(_DL_CMDS[len(data)], index, subindex, data)
         
         msg = can.Message(
             arbitration_id=sdo_tx,
@@ -271,55 +684,171 @@ class CANopenSDOClient:
             is_extended_id=False
         )
         
-        try:
-            # Send request
-            self.bus.send(msg)
-            logger.debug(f"SDO write to 0x{index:04X}:{subindex:02X} = {data.hex()}")
+        with self._transaction([node_id]), self._with_filter(node_id):
+            recv = self._frame_source([(node_id, index, subindex)])
+            try:
+                # Send request
+                self.bus.send(msg)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("SDO write to 0x%04X:%02X = %s", index, subindex, data.hex())
+                
+                # Wait for response
+                monotonic = time.monotonic
+                deadline = monotonic() + timeout
+                
+                while (remaining := deadline - monotonic()) > 0:
+                    frame = recv(remaining)
+                    
+                    if frame is None:
+                        break
+                    
+                    # Filter by SDO RX ID
+                    resp_id, response = frame
+                    if resp_id != sdo_rx:
+                        continue
+                    
+                    # Check for download response (0x60) or abort (0x80)
+                    if len(response) < _SDO_STRUCT.size:
+                        continue
+                    
+                    cmd_byte, resp_index, resp_subindex, payload = _SDO_STRUCT.unpack_from(response)
+                    
+                    if cmd_byte == 0x60:
+                        # Success - verify index/subindex match
+                        if resp_index == index and resp_subindex == subindex:
+                            logger.debug("SDO write successful")
+                            return True
+                        else:
+                            logger.warning("Index mismatch in response")
+                            continue
+                    
+                    elif cmd_byte == 0x80:
+                        # Abort response
+                        abort_code = int.from_bytes(payload, 'little')
+                        logger.error("SDO write abort: 0x%08X", abort_code)
+                        return False
+                
+                # Timeout
+                logger.error("SDO write timeout")
+                return False
+                
+            except Exception as e:
+                logger.error("SDO write error: %s", e)
+                return False
+    
+    def read_many(self, node_id: int, params, timeout: float = 0.5) -> Dict[str, Any]:
+        """
+        Read several named parameters using pipelined SDO uploads
+        
+        Requests are sent back-to-back (at most SDO_MAX_IN_FLIGHT outstanding)
+        and responses are matched by the index/subindex echoed in each reply,
+        so a full readout costs about one round-trip instead of one per SDO.
+        
+        Args:
+            node_id: CANopen node ID
+            params: Parameter names from SDO_MAP
+            timeout: Overall response timeout in seconds
             
-            # Wait for response
-            start_time = time.time()
+        Returns:
+            Dictionary of converted values for the parameters that answered
+        """
+        rows = []
+        for param_name in params:
+            if param_name not in self.SDO_MAP:
+                logger.error("Unknown parameter: %s", param_name)
+                continue
+            sdo = self.SDO_MAP[param_name]
+            rows.append((param_name, sdo.index, sdo.subindex, _DECODERS[sdo.data_type], sdo.inv_divisor))
+        
+        return self._read_batch({node_id: rows}, timeout)[node_id]
+    
+    def _read_batch(self, jobs: Dict[int, Any], timeout: float = 0.5) -> Dict[int, Dict[str, Any]]:
+        """
+        Pipelined SDO readout across one or more nodes
+        
+        Requests for all nodes are interleaved on the bus (at most
+        SDO_MAX_IN_FLIGHT outstanding per node) and responses are matched by
+        COB-ID and the echoed index/subindex. Implementation of read_many()
+        and read_all_parameters_batch().
+        
+        Args:
+            jobs: node_id -> rows of (name, index, subindex, unpack, inv_divisor)
+            timeout: Overall response timeout in seconds
             
-            while (time.time() - start_time) < timeout:
-                response = self.bus.recv(timeout=0.1)
+        Returns:
+            node_id -> dictionary of converted values for the rows that answered
+        """
+        results = {node_id: {} for node_id in jobs}
+        
+        if not self.bus:
+            logger.error("CAN bus not connected")
+            return results
+        
+        # Per-node send queues (popped from the end) and outstanding counts
+        unsupported = self._unsupported
+        queues = {}
+        for node_id, rows in jobs.items():
+            rows = [row for row in reversed(rows) if (node_id, row[1], row[2]) not in unsupported]
+            if rows:
+                queues[node_id] = rows
+        outstanding = dict.fromkeys(queues, 0)
+        
+        # (node_id, index, subindex) -> row, for requests awaiting a response
+        in_flight = {}
+        
+        with self._transaction(queues), self._with_filter(next(iter(jobs)) if len(jobs) == 1 else None):
+            recv = self._frame_source([(node_id, row[1], row[2]) for node_id, rows in queues.items() for row in rows])
+            send = self._send_upload_request
+            monotonic = time.monotonic
+            max_in_flight = self.SDO_MAX_IN_FLIGHT
+            deadline = monotonic() + timeout
+            while (queues or in_flight) and (remaining := deadline - monotonic()) > 0:
+                # Keep every node's pipeline full
+                for node_id in list(queues):
+                    rows = queues[node_id]
+                    while rows and outstanding[node_id] < max_in_flight:
+                        row = rows.pop()
+                        try:
+                            send(node_id, row[1], row[2])
+                        except Exception as e:
+                            logger.error("Failed to send SDO request: %s", e)
+                            return results
+                        in_flight[(node_id, row[1], row[2])] = row
+                        outstanding[node_id] += 1
+                    if not rows:
+                        del queues[node_id]
                 
-                if response is None:
+                try:
+                    frame = recv(remaining)
+                except Exception as e:
+                    logger.debug("SDO recv error: %s", e)
                     continue
                 
-                # Filter by SDO RX ID
-                if response.arbitration_id != sdo_rx:
+                if not frame or len(frame[1]) < _SDO_STRUCT.size:
                     continue
                 
-                # Check for download response (0x60) or abort (0x80)
-                if len(response.data) < 1:
+                node_id = frame[0] - 0x580
+                cmd, resp_index, resp_subindex, payload = _SDO_STRUCT.unpack_from(frame[1])
+                row = in_flight.pop((node_id, resp_index, resp_subindex), None)
+                if row is None:
                     continue
+                outstanding[node_id] -= 1
                 
-                cmd_byte = response.data[0]
-                
-                if cmd_byte == 0x60:
-                    # Success - verify index/subindex match
-                    resp_index = response.data[1] | (response.data[2] << 8)
-                    resp_subindex = response.data[3]
-                    
-                    if resp_index == index and resp_subindex == subindex:
-                        logger.debug(f"SDO write successful")
-                        return True
-                    else:
-                        logger.warning(f"Index mismatch in response")
-                        continue
-                
-                elif cmd_byte == 0x80:
-                    # Abort response
-                    abort_code = int.from_bytes(response.data[4:8], 'little')
-                    logger.error(f"SDO write abort: 0x{abort_code:08X}")
-                    return False
-            
-            # Timeout
-            logger.error(f"SDO write timeout")
-            return False
-            
-        except Exception as e:
-            logger.error(f"SDO write error: {e}")
-            return False
+                param_name, _, _, unpack, inv_divisor = row
+                if cmd == 0x80:  # Abort
+                    abort_code = int.from_bytes(payload, 'little')
+                    logger.debug("Node %d %s not available (abort 0x%08X)", node_id, param_name, abort_code)
+                    self._note_abort(node_id, resp_index, resp_subindex, abort_code)
+                elif cmd in [0x43, 0x47, 0x4B, 0x4F]:  # Upload response
+                    results[node_id][param_name] = unpack(payload)[0] * inv_divisor
+        
+        for (node_id, _, _), row in in_flight.items():
+            logger.debug("Node %d %s timeout", node_id, row[0])
+        for node_id, rows in queues.items():
+            for row in rows:
+                logger.debug("Node %d %s timeout", node_id, row[0])
+        
+        return results
     
     def read_all_parameters(self, node_id: int) -> Dict[str, Any]:
         """
@@ -331,13 +860,232 @@ class CANopenSDOClient:
         Returns:
             Dictionary of parameter values
         """
-        result = {}
+        return self.read_all_parameters_batch([node_id])[node_id]
+    
+    def read_all_parameters_batch(self, node_ids) -> Dict[int, Dict[str, Any]]:
+        """
+        Read all available parameters from several nodes in one wave
+        
+        Every node's SDO requests go out interleaved and are collected in a
+        single receive loop, so the readout takes about as long as the
+        slowest node rather than the sum over all nodes.
+        
+        Args:
+            node_ids: CANopen node IDs
+            
+        Returns:
+            node_id -> dictionary of parameter values (empty if no answer)
+        """
+        # Identity rides along in the same pipelined pass until cached
+        jobs = {}
+        for node_id in node_ids:
+            jobs[node_id] = self._LIVE_PARAMS if node_id in self._identity_cache else self._ALL_PARAMS
+        
+        results = self._read_batch(jobs)
+        
+        for node_id, result in results.items():
+            identity = self._identity_cache.get(node_id)
+            if identity is None:
+                self._cache_identity(node_id, result)
+            elif result:
+                # A silent node must still come back empty
+                result.update(identity)
         
-        for param_name in self.SDO_MAP.keys():
-            value = self.read_parameter(node_id, param_name)
-            if value is not None:
-                result[param_name] = value
+        return results
+    
+    def _cache_identity(self, node_id: int, values: Dict[str, Any]):
+        """Cache the identity parameters in values if all of them are present"""
+        identity = {row[0]: values[row[0]] for row in self._IDENTITY_PARAMS if row[0] in values}
+        if len(identity) == len(self._IDENTITY_PARAMS):
+            self._identity_cache[node_id] = identity
+    
+    def _async_enter(self, loop: asyncio.AbstractEventLoop):
+        """Register an async caller, starting the dispatcher on its loop if needed"""
+        if self._notifier is not None and self._async_loop is not loop:
+            # Left behind by another (possibly closed) event loop
+            self._stop_async_dispatch()
         
+        self._async_users += 1
+        self._start_async_dispatch(loop)
+    
+    def _async_exit(self):
+        """Unregister an async caller; the last one stops the dispatcher"""
+        self._async_users = max(self._async_users - 1, 0)
+        if self._async_users == 0:
+            self._stop_async_dispatch()
+    
+    def _start_async_dispatch(self, loop: asyncio.AbstractEventLoop):
+        """Start the Notifier that routes SDO responses to pending futures"""
+        if self._notifier is not None:
+            return
+        
+        self._async_reader = can.AsyncBufferedReader()
+        # Short recv timeout, so stopping a thread-based Notifier is quick
+        self._notifier = can.Notifier(self.bus, [self._async_reader], timeout=0.1, loop=loop)
+        self._dispatch_task = loop.create_task(self._dispatch_responses())
+        self._async_loop = loop
+    
+    def _stop_async_dispatch(self):
+        """Stop the asyncio response dispatcher, if running"""
+        if self._notifier is None:
+            return
+        
+        notifier, task = self._notifier, self._dispatch_task
+        self._notifier = None
+        self._async_reader = None
+        self._dispatch_task = None
+        self._async_loop = None
+        self._async_users = 0
+        try:
+            notifier.stop()
+            task.cancel()
+            for fut in self._async_pending.values():
+                fut.cancel()
+        except RuntimeError as e:
+            # Loop already closed; nothing is waiting on it any more
+            logger.debug("Stopping async dispatcher: %s", e)
+        self._async_pending.clear()
+        self._async_waiters.clear()
+    
+    async def _dispatch_responses(self):
+        """Resolve pending read_sdo_async() futures from received SDO responses"""
+        async for msg in self._async_reader:
+            node_id = msg.arbitration_id - 0x580
+            if msg.is_extended_id or not 1 <= node_id <= 127 or len(msg.data) < _SDO_STRUCT.size:
+                continue
+            
+            cmd, index, subindex, payload = _SDO_STRUCT.unpack_from(msg.data)
+            key = (node_id, index, subindex)
+            fut = self._async_pending.get(key)
+            if fut is None:
+                continue
+            
+            if cmd == 0x80:  # Abort
+                result = (None, int.from_bytes(payload, 'little'))
+            elif cmd in [0x43, 0x47, 0x4B, 0x4F]:  # Upload response
+                result = (payload, None)
+            else:
+                continue
+            
+            del self._async_pending[key]
+            if not fut.done():
+                fut.set_result(result)
+    
+    async def read_sdo_async(self, node_id: int, index: int, subindex: int,
+                             timeout: float = 0.5) -> Tuple[Optional[bytes], Optional[int]]:
+        """
+        Read SDO value from CANopen node without blocking the event loop
+        
+        Any number of reads, across nodes, may be awaited concurrently; a
+        shared can.Notifier routes each response to its request by node,
+        index and subindex. The Notifier is bound to the running loop and
+        only runs while async calls are in progress, so the blocking API may
+        be used again once they have all returned. Do not call it while any
+        async read is outstanding, since both consume frames from the bus.
+        
+        Args:
+            node_id: CANopen node ID (1-127)
+            index: SDO index
+            subindex: SDO subindex
+            timeout: Response timeout in seconds
+            
+        Returns:
+            Tuple of (data bytes, abort code). One will be None.
+        """
+        if not self.bus:
+            logger.error("CAN bus not connected")
+            return None, None
+        
+        loop = asyncio.get_running_loop()
+        self._async_enter(loop)
+        try:
+            return await self._read_sdo_async(loop, node_id, index, subindex, timeout)
+        finally:
+            self._async_exit()
+    
+    async def _read_sdo_async(self, loop: asyncio.AbstractEventLoop, node_id: int, index: int,
+                              subindex: int, timeout: float) -> Tuple[Optional[bytes], Optional[int]]:
+        """Body of read_sdo_async(), run while the dispatcher is held"""
+        key = (node_id, index, subindex)
+        fut = self._async_pending.get(key)
+        if fut is None:
+            # Only one request per object may be outstanding; later callers
+            # for the same object share its response
+            fut = loop.create_future()
+            self._async_pending[key] = fut
+            try:
+                self._send_upload_request(node_id, index, subindex)
+            except Exception as e:
+                del self._async_pending[key]
+                logger.error("Failed to send SDO request: %s", e)
+                return None, None
+        
+        waiters = self._async_waiters
+        waiters[fut] = waiters.get(fut, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            # Only the last caller waiting on the request retires it; the
+            # others keep waiting for the response until their own timeout
+            if waiters.get(fut, 1) == 1 and self._async_pending.get(key) is fut:
+                del self._async_pending[key]
+                fut.cancel()
+            logger.debug("SDO timeout 0x%04X:%02X", index, subindex)
+            return None, None
+        finally:
+            count = waiters.pop(fut, 1) - 1
+            if count:
+                waiters[fut] = count
+    
+    async def read_all_parameters_async(self, node_id: int, timeout: float = 0.5) -> Dict[str, Any]:
+        """
+        Read all available parameters from a node (asyncio variant)
+        
+        At most SDO_MAX_IN_FLIGHT requests per call are outstanding. Gather
+        several calls to read multiple nodes concurrently.
+        
+        Args:
+            node_id: CANopen node ID
+            timeout: Overall response timeout in seconds
+            
+        Returns:
+            Dictionary of parameter values
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        slots = asyncio.Semaphore(self.SDO_MAX_IN_FLIGHT)
+        
+        async def read_row(row):
+            async with slots:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return row, (None, None)
+                return row, await self.read_sdo_async(node_id, row[1], row[2], remaining)
+        
+        identity = self._identity_cache.get(node_id)
+        rows = self._ALL_PARAMS if identity is None else self._LIVE_PARAMS
+        rows = [row for row in rows if (node_id, row[1], row[2]) not in self._unsupported]
+        
+        # Hold the dispatcher across the whole readout, not just per request
+        self._async_enter(loop)
+        try:
+            responses = await asyncio.gather(*(read_row(row) for row in rows))
+        finally:
+            self._async_exit()
+        
+        result = {}
+        for row, (raw_data, abort) in responses:
+            param_name, index, subindex, unpack, inv_divisor = row
+            if abort is not None:
+                logger.debug("%s not available (abort 0x%08X)", param_name, abort)
+                self._note_abort(node_id, index, subindex, abort)
+            elif raw_data is not None:
+                result[param_name] = unpack(raw_data)[0] * inv_divisor
+        
+        if identity is None:
+            self._cache_identity(node_id, result)
+        elif result:
+            result.update(identity)
         return result
     
     def scan_network(self, node_range: range = range(1, 128)) -> list:
@@ -352,18 +1100,89 @@ class CANopenSDOClient:
         """
         active_nodes = []
         
-        logger.info(f"Scanning for CANopen nodes...")
+        logger.info("Scanning for CANopen nodes...")
+        
+        # One broad filter for the whole scan instead of one per node; the
+        # locks are held too, so a reader starting meanwhile cannot lose it
+        with self._transaction(node_range), self._with_filter():
+            for node_id in node_range:
+                # Try to read device type (0x1000:00)
+                raw_data, abort = self.read_sdo(node_id, 0x1000, 0x00, timeout=0.1)
+                
+                if raw_data is not None:
+                    device_type = self.decode_value(raw_data, 'UINT32')
+                    logger.info("Found node %d: Device Type = 0x%08X", node_id, device_type)
+                    active_nodes.append(node_id)
+        
+        logger.info("Scan complete: %d node(s) found", len(active_nodes))
+        return active_nodes
+
+    
+    def scan_network_fast(self, node_range: range = range(1, 128), timeout: float = 0.1) -> list:
+        """
+        Scan for active CANopen nodes using a single response window
+        
+        All device type (0x1000:00) requests are sent back-to-back and the
+        responses are collected for one timeout, instead of one timeout per
+        node as in scan_network().
+        
+        Args:
+            node_range: Range of node IDs to scan
+            timeout: Response window in seconds after the last request
+            
+        Returns:
+            List of active node IDs
+        """
+        active_nodes = []
+        
+        if not self.bus:
+            logger.error("CAN bus not connected")
+            return active_nodes
+        
+        logger.info("Scanning for CANopen nodes...")
         
-        for node_id in node_range:
-            # Try to read device type (0x1000:00)
-            raw_data, abort = self.read_sdo(node_id, 0x1000, 0x00, timeout=0.1)
+        pending = set(node_range)
+        
+        with self._transaction(node_range), self._with_filter():
+            recv = self._frame_source([(node_id, 0x1000, 0x00) for node_id in node_range])
+            for node_id in node_range:
+                for attempt in range(3):
+                    try:
+                        self._send_upload_request(node_id, 0x1000, 0x00)
+                        break
+                    except can.CanError as e:
+                        # TX queue full, give the controller time to drain it
+                        logger.debug("SDO request to node %d not sent (%s), retrying", node_id, e)
+                        time.sleep(0.005)
+                else:
+                    logger.warning("Failed to send SDO request to node %d", node_id)
             
-            if raw_data is not None:
-                device_type = self.decode_value(raw_data, 'UINT32')
-                logger.info(f"Found node {node_id}: Device Type = 0x{device_type:08X}")
+            monotonic = time.monotonic
+            deadline = monotonic() + timeout
+            while pending and (remaining := deadline - monotonic()) > 0:
+                try:
+                    frame = recv(remaining)
+                except Exception as e:
+                    logger.debug("SDO recv error: %s", e)
+                    continue
+                
+                if not frame or len(frame[1]) < _SDO_STRUCT.size:
+                    continue
+                
+                node_id = frame[0] - 0x580
+                cmd, resp_index, resp_subindex, payload = _SDO_STRUCT.unpack_from(frame[1])
+                if node_id not in pending or cmd not in [0x43, 0x47, 0x4B, 0x4F]:
+                    continue
+                if resp_index != 0x1000 or resp_subindex != 0x00:
+                    continue
+                
+                device_type = self.decode_value(payload, 'UINT32')
+                logger.info("Found node %d: Device Type = 0x%08X", node_id, device_type)
+                pending.discard(node_id)
                 active_nodes.append(node_id)
         
-        logger.info(f"Scan complete: {len(active_nodes)} node(s) found")
+        active_nodes.sort()
+        logger.info("Scan complete: %d node(s) found", len(active_nodes))
         return active_nodes
 
 
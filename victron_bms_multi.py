@@ -12,7 +12,10 @@ import time
 import logging
 import configparser
 import threading
-from typing import Optional, Dict, Any, List
+import collections
+from dataclasses import dataclass
+import signal
+from typing import Optional, Dict, Any, List, Deque
 
 # Setup GLib main loop before importing D-Bus
 from gi.repository import GLib
@@ -43,24 +46,95 @@ except ImportError:
     print("WARNING: Running without Victron D-Bus libraries (testing mode)")
     VeDbusService = None
 
-from bms_canopen_client import CANopenSDOClient
+from bms_canopen_client import CANopenSDOClient, FrozenSlotted
 from bms_firmware_updater import BMSFirmwareUpdater
 
 logger = logging.getLogger(__name__)
 
 
+# D-Bus text formatters, shared by every battery's service
+def _fmt_voltage(path, value):
+    return f"{value:.2f}V" if value is not None else "---"
+
+def _fmt_current(path, value):
+    return f"{value:.2f}A" if value is not None else "---"
+
+def _fmt_power(path, value):
+    return f"{value:.0f}W" if value is not None else "---"
+
+def _fmt_temperature(path, value):
+    return f"{value:.1f}°C" if value is not None else "---"
+
+def _fmt_percent(path, value):
+    return f"{value:.0f}%" if value is not None else "---"
+
+# Unit -> gettextcallback
+_FORMATTERS = {
+    'V': _fmt_voltage,
+    'A': _fmt_current,
+    'W': _fmt_power,
+    '°C': _fmt_temperature,
+    '%': _fmt_percent,
+}
+
+# Error Status (0x2004) bit -> alarm path, per DATASHEET.md section 6
+_ERROR_ALARMS = (
+    (1 << 0, '/Alarms/HighCellVoltage'),
+    (1 << 1, '/Alarms/LowCellVoltage'),
+    (1 << 2, '/Alarms/HighVoltage'),
+    (1 << 3, '/Alarms/LowVoltage'),
+    (1 << 4, '/Alarms/HighChargeCurrent'),
+    (1 << 5, '/Alarms/HighDischargeCurrent'),
+    (1 << 6, '/Alarms/HighTemperature'),
+    (1 << 7, '/Alarms/LowTemperature'),
+    (1 << 8, '/Alarms/InternalFailure'),
+)
+
+# "Never written" marker for BatteryMonitor._last_written lookups
+_UNSET = object()
+
+
+@dataclass(frozen=True)
+class BmsConfig(FrozenSlotted):
+    """Service settings, parsed once from config.ini by load_config()"""
+    # Explicit slots, see FrozenSlotted
+    __slots__ = ('can_interface', 'bitrate', 'node_ids', 'service_prefix', 'device_instance_start',
+                 'product_name', 'update_interval_ms', 'capacity', 'cells')
+    
+    can_interface: str
+    bitrate: int
+    node_ids: str  # 'auto' or comma-separated list
+    service_prefix: str
+    device_instance_start: int
+    product_name: str
+    update_interval_ms: int
+    capacity: float
+    cells: int
+
+
 class BatteryMonitor:
     """Single battery monitor instance"""
     
-    def __init__(self, node_id: int, device_instance: int, config: configparser.ConfigParser,
+    def __init__(self, node_id: int, device_instance: int, config: BmsConfig,
                  canopen_client: CANopenSDOClient):
         self.node_id = node_id
         self.device_instance = device_instance
         self.config = config
         self.canopen_client = canopen_client
         self.dbus_service: Optional[VeDbusService] = None
+        # Connection dedicated to this battery's service, see setup_dbus()
+        self._bus: Optional[dbus.bus.BusConnection] = None
+        self._service_name: Optional[str] = None
         self.last_update = 0
         self.firmware_updater: Optional[BMSFirmwareUpdater] = None
+        # Last value written per D-Bus path, see _set()
+        self._last_written: Dict[str, Any] = {}
+        # D-Bus path -> bound VeDbusItemExport.local_set_value
+        self._setters: Dict[str, Any] = {}
+        # Last readout passed to _update_dbus(), see process()
+        self._last_data: Optional[Dict[str, Any]] = None
+        # Error Status last published to the alarm paths (None until first read)
+        self._alarm_mask: Optional[int] = None
         
     def setup_dbus(self) -> bool:
         """Initialize D-Bus service for this battery"""
@@ -68,13 +142,14 @@ class BatteryMonitor:
             logger.warning(f"Node {self.node_id}: D-Bus not available (testing mode)")
             return True
         
-        service_prefix = self.config['Victron']['service_name_prefix']
-        service_name = f"{service_prefix}_node{self.node_id}"
-        product_name = self.config['Victron']['product_name']
+        service_name = self._service_name = f"{self.config.service_prefix}_node{self.node_id}"
         
         try:
-            # Create separate D-Bus connection for each battery (prevents path conflicts)
-            self.dbus_service = VeDbusService(service_name, dbusconnection())
+            # Separate D-Bus connection for each battery: dbus-python registers
+            # object paths per connection, not per bus name, so two services
+            # on one connection would collide on /Dc/0/Voltage etc.
+            self._bus = dbusconnection()
+            self.dbus_service = VeDbusService(service_name, self._bus)
             
             # Product info
             self.dbus_service.add_path('/Mgmt/ProcessName', __file__)
@@ -82,7 +157,7 @@ class BatteryMonitor:
             self.dbus_service.add_path('/Mgmt/Connection', f'CANopen Node {self.node_id}')
             self.dbus_service.add_path('/DeviceInstance', self.device_instance)
             self.dbus_service.add_path('/ProductId', 0)
-            self.dbus_service.add_path('/ProductName', f"{product_name} (Node {self.node_id})")
+            self.dbus_service.add_path('/ProductName', f"{self.config.product_name} (Node {self.node_id})")
             self.dbus_service.add_path('/FirmwareVersion', '2.0')
             self.dbus_service.add_path('/HardwareVersion', 'Epsilon V2')
             self.dbus_service.add_path('/Connected', 1)
@@ -91,21 +166,20 @@ class BatteryMonitor:
             self.dbus_service.add_path('/CustomName', f'BMS {self.node_id}', writeable=True)
             
             # Battery essentials
-            self.dbus_service.add_path('/Dc/0/Voltage', None, writeable=False, 
-                                      gettextcallback=lambda p, v: f"{v:.2f}V" if v else "---")
+            self.dbus_service.add_path('/Dc/0/Voltage', None, writeable=False,
+                                      gettextcallback=_FORMATTERS['V'])
             self.dbus_service.add_path('/Dc/0/Current', None, writeable=False,
-                                      gettextcallback=lambda p, v: f"{v:.2f}A" if v else "---")
+                                      gettextcallback=_FORMATTERS['A'])
             self.dbus_service.add_path('/Dc/0/Power', None, writeable=False,
-                                      gettextcallback=lambda p, v: f"{v:.0f}W" if v else "---")
+                                      gettextcallback=_FORMATTERS['W'])
             self.dbus_service.add_path('/Dc/0/Temperature', None, writeable=False,
-                                      gettextcallback=lambda p, v: f"{v:.1f}°C" if v else "---")
+                                      gettextcallback=_FORMATTERS['°C'])
             self.dbus_service.add_path('/Soc', None, writeable=False,
-                                      gettextcallback=lambda p, v: f"{v:.0f}%" if v else "---")
+                                      gettextcallback=_FORMATTERS['%'])
             
             # Battery details
-            capacity = float(self.config['Battery']['capacity'])
-            self.dbus_service.add_path('/Capacity', capacity)
-            self.dbus_service.add_path('/InstalledCapacity', capacity)
+            self.dbus_service.add_path('/Capacity', self.config.capacity)
+            self.dbus_service.add_path('/InstalledCapacity', self.config.capacity)
             self.dbus_service.add_path('/ConsumedAmphours', None, writeable=False)
             
             # Battery info
@@ -114,8 +188,7 @@ class BatteryMonitor:
             self.dbus_service.add_path('/Info/MaxDischargeCurrent', None, writeable=False)
             
             # System info
-            self.dbus_service.add_path('/System/NrOfCellsPerBattery', 
-                                      int(self.config['Battery']['number_of_cells']))
+            self.dbus_service.add_path('/System/NrOfCellsPerBattery', self.config.cells)
             self.dbus_service.add_path('/System/NrOfModulesOnline', 1)
             self.dbus_service.add_path('/System/NrOfModulesOffline', 0)
             self.dbus_service.add_path('/System/NrOfModulesBlockingCharge', 0)
@@ -140,6 +213,10 @@ class BatteryMonitor:
             self.dbus_service.add_path('/Alarms/HighTemperature', 0, writeable=False)
             self.dbus_service.add_path('/Alarms/LowTemperature', 0, writeable=False)
             
+            # Bind the setters once, so per-tick writes skip __setitem__ dispatch
+            self._setters = {path: item.local_set_value
+                             for path, item in self.dbus_service._dbusobjects.items()}
+            
             logger.info(f"Node {self.node_id}: D-Bus service initialized ({service_name})")
             return True
             
@@ -152,14 +229,24 @@ class BatteryMonitor:
         try:
             # Read all parameters
             bms_data = self.canopen_client.read_all_parameters(self.node_id)
-            
+        except Exception as e:
+            logger.error(f"Node {self.node_id}: Update error: {e}")
+            return False
+        
+        return self.process(bms_data)
+    
+    def process(self, bms_data: Dict[str, Any]) -> bool:
+        """Publish BMS data that has already been read for this battery"""
+        try:
             if not bms_data:
                 logger.warning(f"Node {self.node_id}: No data received")
                 return False
             
-            # Update D-Bus
-            if self.dbus_service:
+            # Update D-Bus, unless the readout is identical to the last one
+            # (SOC, cycles and Ah counters move far slower than the poll rate)
+            if self.dbus_service and bms_data != self._last_data:
                 self._update_dbus(bms_data)
+                self._last_data = bms_data
             
             self.last_update = time.time()
             return True
@@ -168,45 +255,94 @@ class BatteryMonitor:
             logger.error(f"Node {self.node_id}: Update error: {e}")
             return False
     
+    def _set(self, path: str, value):
+        """Write a D-Bus path, skipping the write (and its signal) if unchanged"""
+        last = self._last_written.get(path, _UNSET)
+        if last is not _UNSET:
+            if last == value or (last is not None and value is not None and abs(last - value) < 1e-3):
+                return
+        
+        self._last_written[path] = value
+        self._setters[path](value)
+    
     def _update_dbus(self, bms_data: Dict[str, Any]):
         """Update D-Bus paths with BMS data"""
         try:
-            # Essential battery data
-            if 'voltage' in bms_data:
-                self.dbus_service['/Dc/0/Voltage'] = bms_data['voltage']
+            set_path = self._set
+            get = bms_data.get
+            voltage = get('voltage')
+            current = get('current')
+            temperature = get('temperature')
+            soc = get('soc')
+            cycles = get('cycles')
+            ah_since_eq = get('ah_since_eq')
+            error_status = get('error_status')
+            
+            # Essential battery data; quantized so sensor noise below the
+            # displayed resolution does not defeat the _set() change check
+            if voltage is not None:
+                set_path('/Dc/0/Voltage', round(voltage, 2))
             
-            if 'current' in bms_data:
+            if current is not None:
                 # Current from 0x2000:02 is already signed (positive=charge, negative=discharge)
-                current = bms_data['current']
-                self.dbus_service['/Dc/0/Current'] = current
+                set_path('/Dc/0/Current', round(current, 2))
                 
-                if 'voltage' in bms_data:
-                    power = bms_data['voltage'] * current
-                    self.dbus_service['/Dc/0/Power'] = power
+                if voltage is not None:
+                    # Whole watts, as displayed: V*I jitter below 1 W sends no signal
+                    set_path('/Dc/0/Power', round(voltage * current, 0))
             
-            if 'temperature' in bms_data:
-                self.dbus_service['/Dc/0/Temperature'] = bms_data['temperature']
+            if temperature is not None:
+                set_path('/Dc/0/Temperature', temperature)
             
-            if 'soc' in bms_data:
-                self.dbus_service['/Soc'] = bms_data['soc']
-                
-                capacity = float(self.config['Battery']['capacity'])
-                consumed = capacity * (100 - bms_data['soc']) / 100
-                self.dbus_service['/ConsumedAmphours'] = consumed
+            if soc is not None:
+                soc = int(round(soc))
+                set_path('/Soc', soc)
+                set_path('/ConsumedAmphours', self.config.capacity * (100 - soc) / 100)
+            
+            if cycles is not None:
+                set_path('/History/ChargeCycles', int(cycles))
             
-            if 'cycles' in bms_data:
-                self.dbus_service['/History/ChargeCycles'] = int(bms_data['cycles'])
+            if ah_since_eq is not None:
+                set_path('/History/TotalAhDrawn', ah_since_eq)
             
-            if 'ah_since_eq' in bms_data:
-                self.dbus_service['/History/TotalAhDrawn'] = bms_data['ah_since_eq']
+            if error_status is not None:
+                # Alarms rarely change: touch the paths only when the mask does
+                mask = int(error_status)
+                if mask != self._alarm_mask:
+                    for bit, path in _ERROR_ALARMS:
+                        set_path(path, 2 if mask & bit else 0)
+                    self._alarm_mask = mask
             
-            logger.debug(f"Node {self.node_id}: V={bms_data.get('voltage', 0):.2f}V, "
-                        f"I={bms_data.get('current', 0):.2f}A, "
-                        f"SOC={bms_data.get('soc', 0):.0f}%")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Node %d: V=%.2fV, I=%.2fA, SOC=%.0f%%", self.node_id,
+                             voltage or 0, current or 0, soc or 0)
             
         except Exception as e:
             logger.error(f"Node {self.node_id}: Error updating D-Bus: {e}")
     
+    def close(self):
+        """Release this battery's D-Bus name and close its connection, exactly once"""
+        if self.dbus_service is None:
+            return
+        
+        service = self.dbus_service
+        self.dbus_service = None
+        self._setters = {}
+        try:
+            # Empty velib's containers so VeDbusService.__del__ finds nothing
+            # left to tear down. The items are not removed one by one: the
+            # connection keeps them alive, and an item removed here would run
+            # remove_from_connection() again from its own __del__ and raise.
+            service._dbusobjects.clear()
+            service._dbusnodes.clear()
+            # Dropping the only BusName reference releases the name (once)
+            service._dbusname = None
+            # Closing the connection takes every exported path off the bus
+            self._bus.close()
+            logger.info(f"Node {self.node_id}: D-Bus service removed ({self._service_name})")
+        except Exception as e:
+            logger.warning(f"Node {self.node_id}: Error removing D-Bus service: {e}")
+    
     def update_firmware(self, hex_file_path: str, progress_callback=None) -> bool:
         """
         Update BMS firmware
@@ -222,7 +358,16 @@ class BatteryMonitor:
             logger.error(f"Node {self.node_id}: Firmware updater not initialized")
             return False
         
-        return self.firmware_updater.update_firmware(hex_file_path, progress_callback)
+        # The updater shares the service's CAN socket: pause the readout and
+        # lift the SDO response filter while it runs
+        with self.canopen_client.exclusive_bus():
+            success = self.firmware_updater.update_firmware(hex_file_path, progress_callback)
+        
+        if success:
+            # New firmware may add objects (e.g. ah_expended on v1.2+) and
+            # changes the identity revision: probe the node afresh
+            self.canopen_client.invalidate_capability_cache(self.node_id)
+        return success
 
 
 class VictronMultiBMSService:
@@ -233,9 +378,14 @@ class VictronMultiBMSService:
         self.canopen_client: Optional[CANopenSDOClient] = None
         self.batteries: List[BatteryMonitor] = []
         self.running = False
+        # A single reader thread owns the CAN bus and queues one result set
+        # (node_id -> values) per interval; the GLib loop only drains the queue
+        self._rx_queue: Deque[Dict[int, Dict[str, Any]]] = collections.deque(maxlen=16)
+        self._reader: Optional[threading.Thread] = None
+        self._reader_stop = threading.Event()
         
-    def load_config(self, config_file: str) -> configparser.ConfigParser:
-        """Load configuration"""
+    def load_config(self, config_file: str) -> BmsConfig:
+        """Load configuration and parse it into a BmsConfig"""
         config = configparser.ConfigParser()
         
         # Defaults
@@ -265,25 +415,32 @@ class VictronMultiBMSService:
         else:
             logger.warning(f"Config file {config_file} not found, using defaults")
         
-        return config
+        return BmsConfig(
+            can_interface=config.get('CAN', 'interface'),
+            bitrate=config.getint('CAN', 'bitrate'),
+            node_ids=config.get('CAN', 'node_ids').strip(),
+            service_prefix=config.get('Victron', 'service_name_prefix'),
+            device_instance_start=config.getint('Victron', 'device_instance_start'),
+            product_name=config.get('Victron', 'product_name'),
+            update_interval_ms=int(config.getfloat('Victron', 'update_interval') * 1000),
+            capacity=config.getfloat('Battery', 'capacity'),
+            cells=config.getint('Battery', 'number_of_cells'),
+        )
     
     def setup_canopen(self) -> bool:
         """Initialize CANopen client"""
-        can_interface = self.config['CAN']['interface']
-        bitrate = int(self.config['CAN']['bitrate'])
-        
-        self.canopen_client = CANopenSDOClient(can_interface, bitrate)
+        self.canopen_client = CANopenSDOClient(self.config.can_interface, self.config.bitrate)
         
         if not self.canopen_client.connect():
             logger.error("Failed to connect to CAN bus")
             return False
         
         # Determine node IDs
-        node_ids_config = self.config['CAN']['node_ids'].strip()
+        node_ids_config = self.config.node_ids
         
         if node_ids_config.lower() == 'auto':
             logger.info("Auto-detecting BMS nodes...")
-            node_ids = self.canopen_client.scan_network(range(1, 10))
+            node_ids = self.canopen_client.scan_network_fast(range(1, 10))
             if not node_ids:
                 logger.error("No CANopen nodes found")
                 return False
@@ -294,7 +451,7 @@ class VictronMultiBMSService:
         logger.info(f"Using BMS nodes: {node_ids}")
         
         # Create battery monitor for each node
-        device_instance = int(self.config['Victron']['device_instance_start'])
+        device_instance = self.config.device_instance_start
         
         for node_id in node_ids:
             battery = BatteryMonitor(node_id, device_instance, self.config, self.canopen_client)
@@ -315,11 +472,29 @@ class VictronMultiBMSService:
         
         return True
     
-    def _update_callback(self):
-        """Callback for periodic updates"""
+    def _can_reader(self):
+        """Read all batteries once per update interval and queue the results"""
+        node_ids = [b.node_id for b in self.batteries]
+        interval = self.config.update_interval_ms / 1000.0
+        next_tick = time.monotonic()
+        while not self._reader_stop.wait(max(next_tick - time.monotonic(), 0)):
+            next_tick += interval
+            try:
+                # One interleaved SDO wave for all batteries instead of one per battery
+                self._rx_queue.append(self.canopen_client.read_all_parameters_batch(node_ids))
+            except Exception as e:
+                logger.error(f"Readout error: {e}", exc_info=True)
+            
+            # After an overrun, start the next interval now instead of catching up
+            next_tick = max(next_tick, time.monotonic())
+    
+    def _drain(self):
+        """GLib callback: publish the readouts queued by _can_reader()"""
         try:
-            for battery in self.batteries:
-                battery.update()
+            while self._rx_queue:
+                results = self._rx_queue.popleft()
+                for battery in self.batteries:
+                    battery.process(results.get(battery.node_id, {}))
             return True  # Continue calling
         except Exception as e:
             logger.error(f"Update error: {e}", exc_info=True)
@@ -333,7 +508,7 @@ class VictronMultiBMSService:
             logger.error("CANopen setup failed")
             return False
         
-        update_interval = int(float(self.config['Victron']['update_interval']) * 1000)  # Convert to ms
+        update_interval = self.config.update_interval_ms
         self.running = True
         
         logger.info(f"Service running (update interval: {update_interval}ms)")
@@ -341,8 +516,14 @@ class VictronMultiBMSService:
         # Setup GLib main loop
         mainloop = GLib.MainLoop()
         
-        # Register periodic update callback
-        GLib.timeout_add(update_interval, self._update_callback)
+        # systemd stops the service with SIGTERM: leave the loop so cleanup() runs
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, self._on_sigterm, mainloop)
+        
+        # CAN I/O stays on the reader thread; the main loop only publishes
+        self._reader_stop.clear()
+        self._reader = threading.Thread(target=self._can_reader, name='bms-can-reader', daemon=True)
+        self._reader.start()
+        GLib.timeout_add(50, self._drain)
         
         try:
             mainloop.run()
@@ -355,17 +536,28 @@ class VictronMultiBMSService:
         
         return True
     
+    def _on_sigterm(self, mainloop):
+        """GLib signal handler: stop the main loop"""
+        logger.info("SIGTERM received, stopping")
+        mainloop.quit()
+        return False  # Remove the handler
+    
     def cleanup(self):
         """Cleanup resources"""
         logger.info("Cleaning up...")
         self.running = False
         
+        # Let an in-flight readout finish before the bus goes away
+        if self._reader:
+            self._reader_stop.set()
+            self._reader.join()
+            self._reader = None
+        
         if self.canopen_client:
             self.canopen_client.disconnect()
         
         for battery in self.batteries:
-            if battery.dbus_service:
-                battery.dbus_service.__del__()
+            battery.close()
 
 
 def main():